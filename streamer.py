@@ -4,26 +4,198 @@ YouTube 24/7 Live Streamer with Google Drive Support
 Supports large files from Google Drive (1-2GB+)
 """
 
+import io
+import hashlib
 import os
 import sys
+import json
 import subprocess
 import time
 import re
+import random
+import shutil
+import signal
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+# Optional HTTP/2 support for parallel ranged downloads
+try:
+    import httpx
+    import h2  # noqa: F401 - needed by httpx for http2=True
+except ImportError:
+    httpx = None
+
+# Google Drive file ID, from any of the common share URL forms
+_GDRIVE_ID_RE = re.compile(
+    r'/file/d/([a-zA-Z0-9_-]+)'
+    r'|id=([a-zA-Z0-9_-]+)'
+    r'|/open\?id=([a-zA-Z0-9_-]+)'
+    r'|/d/([a-zA-Z0-9_-]+)'
+)
+# Download confirmation token in the Drive warning page
+_CONFIRM_RE = re.compile(r'confirm=([^&"]+)')
+# Numbers and addresses in FFmpeg log lines, masked to spot repeated warnings
+_FFMPEG_NUMBER_RE = re.compile(r'0x[0-9a-fA-F]+|\d+')
+
+class CountingWriter:
+    """File wrapper that counts written bytes, reports progress and optionally hashes"""
+    
+    def __init__(self, f, report, interval, total_size=0, hasher=None):
+        self.f = f
+        self.report = report
+        self.interval = interval
+        self.total_size = total_size
+        self.hasher = hasher
+        self.written = 0
+        self.last_report = time.monotonic()
+    
+    def write(self, data):
+        self.f.write(data)
+        if self.hasher:
+            self.hasher.update(data)
+        self.written += len(data)
+        
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.report(self.written, self.total_size)
+            self.last_report = now
+        return len(data)
+
+class OffsetWriter:
+    """File-like writer putting data at an advancing offset with os.pwrite"""
+    
+    def __init__(self, fd, offset):
+        self.fd = fd
+        self.offset = offset
+    
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fd, view, self.offset)
+            self.offset += written
+            view = view[written:]
+        return len(data)
+
 class YouTubeStreamer:
+    # Parallel ranged download settings
+    DOWNLOAD_WORKERS = 8
+    RANGE_SLICE = 16 * 1024 * 1024
+    SLICE_RETRIES = 3
+    # Read size for streamed downloads
+    CHUNK = 512 * 1024
+    # Buffer size for shutil.copyfileobj
+    COPY_BUFFER = 1024 * 1024
+    # Seconds between download progress reports
+    PROGRESS_INTERVAL = 2.0
+    # Bytes from the start of the file needed before streaming during download
+    EARLY_START_BYTES = 20 * 1024 * 1024
+    
+    # (width, height, video bitrate, buffer size) for each quality and aspect ratio
+    RES_TABLE = {
+        ('360p', '16:9'): (640, 360, '800k', '1600k'),
+        ('480p', '16:9'): (854, 480, '1200k', '2400k'),
+        ('720p', '16:9'): (1280, 720, '2500k', '5000k'),
+        ('1080p', '16:9'): (1920, 1080, '4500k', '9000k'),
+        ('1440p', '16:9'): (2560, 1440, '9000k', '18000k'),
+        ('2160p', '16:9'): (3840, 2160, '20000k', '40000k'),
+        ('360p', '9:16'): (202, 360, '800k', '1600k'),
+        ('480p', '9:16'): (270, 480, '1200k', '2400k'),
+        ('720p', '9:16'): (406, 720, '2500k', '5000k'),
+        ('1080p', '9:16'): (608, 1080, '4500k', '9000k'),
+        ('1440p', '9:16'): (810, 1440, '9000k', '18000k'),
+        ('2160p', '9:16'): (1216, 2160, '20000k', '40000k'),
+        ('360p', '4:3'): (480, 360, '800k', '1600k'),
+        ('480p', '4:3'): (640, 480, '1200k', '2400k'),
+        ('720p', '4:3'): (960, 720, '2500k', '5000k'),
+        ('1080p', '4:3'): (1440, 1080, '4500k', '9000k'),
+        ('1440p', '4:3'): (1920, 1440, '9000k', '18000k'),
+        ('2160p', '4:3'): (2880, 2160, '20000k', '40000k'),
+        ('360p', '1:1'): (360, 360, '800k', '1600k'),
+        ('480p', '1:1'): (480, 480, '1200k', '2400k'),
+        ('720p', '1:1'): (720, 720, '2500k', '5000k'),
+        ('1080p', '1:1'): (1080, 1080, '4500k', '9000k'),
+        ('1440p', '1:1'): (1440, 1440, '9000k', '18000k'),
+        ('2160p', '1:1'): (2160, 2160, '20000k', '40000k'),
+    }
+    
+    # Longest keyframe spacing (seconds) accepted for stream copy, and how much to probe
+    MAX_KEYFRAME_INTERVAL = 2.0
+    KEYFRAME_PROBE_SECONDS = 10
+    
+    # Quiet log, machine-readable progress on stdout for the stall watchdog
+    FFMPEG_LOG_ARGS = ['-loglevel', 'warning', '-nostats', '-progress', 'pipe:1']
+    
+    # H.264 encoders in order of preference, libx264 is the CPU fallback
+    VIDEO_ENCODERS = {
+        'h264_nvenc': {
+            'input': ['-hwaccel', 'cuda'],
+            'filter': '',
+            'codec': ['-c:v', 'h264_nvenc', '-preset', 'p4', '-tune', 'll', '-rc', 'cbr', '-pix_fmt', 'yuv420p'],
+        },
+        'h264_qsv': {
+            'input': [],
+            'filter': '',
+            'codec': ['-c:v', 'h264_qsv', '-preset', 'veryfast', '-pix_fmt', 'nv12'],
+        },
+        'h264_vaapi': {
+            'input': ['-vaapi_device', '/dev/dri/renderD128'],
+            'filter': ',format=nv12,hwupload',
+            'codec': ['-c:v', 'h264_vaapi', '-rc_mode', 'CBR'],
+        },
+        'h264_videotoolbox': {
+            'input': [],
+            'filter': '',
+            'codec': ['-c:v', 'h264_videotoolbox', '-realtime', '1', '-pix_fmt', 'yuv420p'],
+        },
+        'libx264': {
+            'input': [],
+            'filter': '',
+            'codec': ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p'],
+        },
+    }
+
     def __init__(self):
         self.stream_key = os.getenv('YOUTUBE_STREAM_KEY')
         self.video_url = os.getenv('VIDEO_URL')
         self.quality = os.getenv('VIDEO_QUALITY', '720p')
         self.aspect_ratio = os.getenv('ASPECT_RATIO', '16:9')
+        self.loop = os.getenv('VIDEO_LOOP', 'true').lower() not in ('0', 'false', 'no')
         
         # Streaming settings
         self.rtmp_url = f"rtmp://a.rtmp.youtube.com/live2/{self.stream_key}"
         self.video_file = "video.mp4"
+        self.hash_file_path = self.video_file + ".sha256"
+        self.expected_sha256 = os.getenv('EXPECTED_SHA256', '').strip().lower()
         self.max_retries = 3
         self.retry_delay = 5
+        self.max_retry_delay = 60
+        self.healthy_session = 300  # Sessions running this long reset the backoff
+        self.log_interval = 60  # Seconds between echoed FFmpeg progress lines
+        self.stall_timeout = 30  # Seconds without new frames before FFmpeg is restarted
+        self.last_progress = 0
+        self.video_encoder = 'libx264'
+        self.video_duration = None
+        self.video_hash = None
+        self.download_ok = False
+        self.downloaded_prefix = 0  # Bytes on disk contiguous from the start of the file
+        self.early_process = None
+        self.early_paused = False
+        self.stream_position = 0  # Seconds of video FFmpeg has sent so far
+        self.ffmpeg_cmd = None
+        
+        # Shared HTTP session, keeps connections alive across requests
+        self.session = requests.Session()
+        retries = Retry(total=self.max_retries, backoff_factor=1,
+                        status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Videos are already compressed, don't let the server gzip them
+        self.session.headers.update({'Accept-Encoding': 'identity'})
         
     def print_status(self, message, emoji="ℹ️"):
         """Print status with emoji"""
@@ -36,17 +208,9 @@ class YouTubeStreamer:
     
     def extract_gdrive_id(self, url):
         """Extract file ID from Google Drive URL"""
-        patterns = [
-            r'/file/d/([a-zA-Z0-9_-]+)',
-            r'id=([a-zA-Z0-9_-]+)',
-            r'/open\?id=([a-zA-Z0-9_-]+)',
-            r'/d/([a-zA-Z0-9_-]+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
+        match = _GDRIVE_ID_RE.search(url)
+        if match:
+            return next(group for group in match.groups() if group)
         return None
     
     def download_from_gdrive(self, file_id, output_path):
@@ -54,7 +218,7 @@ class YouTubeStreamer:
         self.print_status("Downloading from Google Drive (large file method)...", "📥")
         
         # Method 1: Try using requests with proper headers
-        session = requests.Session()
+        session = self.session
         
         # Google Drive direct download URL
         base_url = "https://drive.google.com/uc?export=download"
@@ -65,20 +229,20 @@ class YouTubeStreamer:
             response = session.get(base_url, params={'id': file_id}, stream=True)
             
             # Extract confirm token from response
-            token = None
-            for key, value in response.cookies.items():
-                if key.startswith('download_warning'):
-                    token = value
-                    break
+            token = next((value for key, value in response.cookies.items()
+                          if key.startswith('download_warning')), None)
             
-            # If token not in cookies, look in HTML
+            # If token not in cookies, look in the start of the HTML
             if not token:
-                content = response.text
-                match = re.search(r'confirm=([^&"]+)', content)
+                response.raw.decode_content = True
+                content = response.raw.read(65536).decode('utf-8', errors='ignore')
+                match = _CONFIRM_RE.search(content)
                 if match:
                     token = match.group(1)
                     self.print_status(f"Found confirmation token: {token[:20]}...", "🔑")
             
+            response.close()
+            
             # Second request with token
             if token:
                 params = {'id': file_id, 'confirm': token}
@@ -102,36 +266,198 @@ class YouTubeStreamer:
             else:
                 self.print_status("Downloading (size unknown)...", "📊")
             
-            downloaded = 0
-            chunk_size = 32768
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        # Progress every 50MB
-                        if downloaded % (1024 * 1024 * 50) < chunk_size:
-                            self.print_status(f"Downloaded: {downloaded/(1024*1024):.1f} MB", "⬇️")
-            
-            file_size = os.path.getsize(output_path)
-            self.print_status(f"Download complete: {file_size/(1024*1024):.1f} MB", "✅")
+            # Probe for Range support with the first slice
+            if total_size > 0:
+                response.close()
+                first_end = min(self.RANGE_SLICE, total_size) - 1
+                response = session.get(base_url, params=params,
+                                       headers={'Range': f'bytes=0-{first_end}'},
+                                       stream=True, timeout=60)
+                
+                if response.status_code == 206:
+                    self.download_ranges(session, base_url, params, total_size,
+                                         output_path, response)
+                    return self.verify_gdrive_download(file_id, output_path)
+                
+                self.print_status("Server ignored Range, using single stream...", "⚠️")
             
-            # Verify file is valid
-            if file_size < 10000:  # Less than 10KB is probably an error page
-                self.print_status("Downloaded file too small, trying alternative...", "⚠️")
-                return self.download_gdrive_alternative(file_id, output_path)
+            self.write_response(response, output_path, total_size)
             
-            return True
+            return self.verify_gdrive_download(file_id, output_path)
             
         except Exception as e:
             self.print_status(f"Download error: {e}", "❌")
             return self.download_gdrive_alternative(file_id, output_path)
     
+    def write_response(self, response, output_path, total_size):
+        """Stream a response body into a file, hashing it on the way"""
+        with open(output_path, 'wb') as f:
+            self.preallocate(f.fileno(), total_size)
+            self.fadvise(f.fileno(), 'POSIX_FADV_SEQUENTIAL')
+            writer = CountingWriter(f, self.report_sequential, self.PROGRESS_INTERVAL, total_size,
+                                    hashlib.sha256())
+            self.copy_response(response, writer)
+            self.video_hash = writer.hasher.hexdigest()
+            f.truncate()  # Drop preallocated space if the body was shorter
+            self.fadvise(f.fileno(), 'POSIX_FADV_DONTNEED')
+    
+    def copy_response(self, response, f):
+        """Copy a streamed response body to a file object in a C-level loop"""
+        with response:
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, f, length=self.COPY_BUFFER)
+    
+    def preallocate(self, fd, size):
+        """Reserve contiguous disk space for a file of known size"""
+        if size <= 0:
+            return
+        # fallocate never shrinks, so cut off any leftover from an older, larger file
+        os.ftruncate(fd, size)
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except (AttributeError, OSError):
+            pass  # Sparse file from ftruncate is good enough
+    
+    def fadvise(self, fd, advice):
+        """Give the kernel a page cache hint for a file, where supported"""
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        try:
+            # Dirty pages are not dropped, write them back first
+            if advice == 'POSIX_FADV_DONTNEED':
+                os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, getattr(os, advice))
+        except OSError:
+            pass
+    
+    def report_sequential(self, downloaded, total_size):
+        """Progress callback for downloads written front to back"""
+        self.downloaded_prefix = downloaded
+        self.report_download(downloaded, total_size)
+    
+    def report_download(self, downloaded, total_size):
+        """Print download progress"""
+        if total_size > 0:
+            progress = (downloaded / total_size) * 100
+            self.print_status(f"Downloaded: {downloaded/(1024*1024):.1f} MB ({progress:.1f}%)", "⬇️")
+        else:
+            self.print_status(f"Downloaded: {downloaded/(1024*1024):.1f} MB", "⬇️")
+    
+    def verify_gdrive_download(self, file_id, output_path):
+        """Check downloaded file size, fall back to alternative method if invalid"""
+        file_size = os.path.getsize(output_path)
+        self.print_status(f"Download complete: {file_size/(1024*1024):.1f} MB", "✅")
+        
+        # Verify file is valid
+        if file_size < 10000:  # Less than 10KB is probably an error page
+            self.print_status("Downloaded file too small, trying alternative...", "⚠️")
+            return self.download_gdrive_alternative(file_id, output_path)
+        
+        return True
+    
+    def download_ranges(self, session, url, params, total_size, output_path, first_response):
+        """Download file as parallel byte ranges into a pre-sized file"""
+        slices = [(lo, min(lo + self.RANGE_SLICE, total_size) - 1)
+                  for lo in range(0, total_size, self.RANGE_SLICE)]
+        self.print_status(f"Parallel download: {len(slices)} slices, {self.DOWNLOAD_WORKERS} workers", "⚡")
+        
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        client = self.make_http2_client()
+        
+        def fetch_once(writer, hi, response=None, http2=True):
+            headers = {'Range': f'bytes={writer.offset}-{hi}'}
+            
+            if response is None and http2 and client is not None:
+                with client.stream('GET', url, params=params, headers=headers) as response:
+                    if response.status_code != 206:
+                        raise IOError(f"HTTP {response.status_code}")
+                    for chunk in response.iter_bytes(self.CHUNK):
+                        writer.write(chunk)
+            else:
+                if response is None:
+                    response = session.get(url, params=params, headers=headers, stream=True, timeout=60)
+                if response.status_code != 206:
+                    response.close()
+                    raise IOError(f"HTTP {response.status_code}")
+                self.copy_response(response, writer)
+            
+            if writer.offset != hi + 1:
+                raise IOError(f"ended early at byte {writer.offset}")
+        
+        def fetch(lo, hi, response=None):
+            writer = OffsetWriter(fd, lo)
+            for attempt in range(self.SLICE_RETRIES + 1):
+                try:
+                    # Retries go through the session, whose adapter backs off on 429/5xx
+                    fetch_once(writer, hi, response, http2=attempt == 0)
+                    return hi - lo + 1
+                except Exception as e:
+                    if attempt == self.SLICE_RETRIES:
+                        raise IOError(f"Range {lo}-{hi} failed: {e}")
+                    self.print_status(f"Range {lo}-{hi} failed ({e}), resuming from byte {writer.offset}...", "🔄")
+                    time.sleep(2 ** attempt)
+                    response = None
+        
+        try:
+            self.preallocate(fd, total_size)
+            
+            with ThreadPoolExecutor(max_workers=self.DOWNLOAD_WORKERS) as pool:
+                futures = [pool.submit(fetch, *slices[0], first_response)]
+                futures += [pool.submit(fetch, lo, hi) for lo, hi in slices[1:]]
+                
+                index = {future: i for i, future in enumerate(futures)}
+                done = [False] * len(slices)
+                next_slice = 0
+                
+                downloaded = 0
+                last_report = time.monotonic()
+                try:
+                    for future in as_completed(futures):
+                        downloaded += future.result()
+                        
+                        # Track how far the file is complete from the start
+                        done[index[future]] = True
+                        while next_slice < len(slices) and done[next_slice]:
+                            next_slice += 1
+                        if next_slice:
+                            self.downloaded_prefix = slices[next_slice - 1][1] + 1
+                        
+                        now = time.monotonic()
+                        if now - last_report >= self.PROGRESS_INTERVAL:
+                            self.report_download(downloaded, total_size)
+                            last_report = now
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            os.close(fd)
+            if client is not None:
+                client.close()
+    
+    def make_http2_client(self):
+        """Create an HTTP/2 httpx client sharing the session cookies, if httpx is installed"""
+        if httpx is None:
+            return None
+        
+        self.print_status("Using HTTP/2 for parallel ranges", "🔀")
+        return httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+            timeout=60,
+            follow_redirects=True,
+            cookies=self.session.cookies,
+            headers={'Accept-Encoding': 'identity'}
+        )
+    
     def download_gdrive_alternative(self, file_id, output_path):
         """Alternative download method using gdown or wget"""
         self.print_status("Trying alternative download method...", "🔄")
+        self.video_hash = None
+        self.downloaded_prefix = 0
+        # Anything probed from the first attempt's partial file is stale
+        self.video_duration = None
+        self.ffmpeg_cmd = None
         
         # Try installing and using gdown
         try:
@@ -164,6 +490,7 @@ class YouTubeStreamer:
     def download_video(self):
         """Download video from URL (supports Google Drive)"""
         self.print_status("Preparing video download...", "🎬")
+        self.downloaded_prefix = 0
         
         # Check if it's a Google Drive URL
         if self.is_google_drive_url(self.video_url):
@@ -185,22 +512,17 @@ class YouTubeStreamer:
             # Regular download for non-Google Drive URLs
             self.print_status("Downloading from direct URL...", "📥")
             
+            # Prefer aria2c multi-connection download when installed
+            if shutil.which('aria2c') and self.download_aria2c(self.video_url, self.video_file):
+                return True
+            
             try:
-                response = requests.get(self.video_url, stream=True, timeout=30)
+                response = self.session.get(self.video_url, stream=True, timeout=30)
                 response.raise_for_status()
                 
                 total_size = int(response.headers.get('content-length', 0))
                 
-                with open(self.video_file, 'wb') as f:
-                    downloaded = 0
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            if total_size > 0 and downloaded % (1024 * 1024 * 10) < 8192:
-                                progress = (downloaded / total_size) * 100
-                                self.print_status(f"Downloaded: {downloaded/(1024*1024):.1f}MB ({progress:.1f}%)", "⬇️")
+                self.write_response(response, self.video_file, total_size)
                 
                 self.print_status("Download complete!", "✅")
                 return True
@@ -209,8 +531,82 @@ class YouTubeStreamer:
                 self.print_status(f"Download error: {e}", "❌")
                 return False
     
+    def download_aria2c(self, url, output_path):
+        """Download with aria2c using multiple connections"""
+        self.print_status("Downloading with aria2c (16 connections)...", "⚡")
+        
+        try:
+            out_dir, out_name = os.path.split(os.path.abspath(output_path))
+            result = subprocess.run(
+                ['aria2c', '-x', '16', '-s', '16', '-k', '1M',
+                 '--file-allocation=falloc', '--console-log-level=warn',
+                 '--allow-overwrite=true', '--auto-file-renaming=false',
+                 '-d', out_dir, '-o', out_name, url],
+                timeout=1800  # 30 minutes timeout
+            )
+            
+            if result.returncode == 0 and os.path.exists(output_path):
+                file_size = os.path.getsize(output_path)
+                self.print_status(f"Download complete: {file_size/(1024*1024):.1f} MB", "✅")
+                if file_size > 10000:
+                    return True
+            
+            self.print_status(f"aria2c failed (code {result.returncode}), falling back...", "⚠️")
+            
+        except Exception as e:
+            self.print_status(f"aria2c error: {e}", "❌")
+        
+        return False
+    
+    def drop_video_cache(self):
+        """Drop the video file's pages from the page cache"""
+        try:
+            fd = os.open(self.video_file, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            self.fadvise(fd, 'POSIX_FADV_DONTNEED')
+        finally:
+            os.close(fd)
+    
+    def hash_file(self):
+        """Compute SHA-256 of the video file"""
+        hasher = hashlib.sha256()
+        with open(self.video_file, 'rb') as f:
+            for block in iter(lambda: f.read(self.COPY_BUFFER), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def read_cached_hash(self):
+        """Read SHA-256 saved by a previous download, if any"""
+        try:
+            with open(self.hash_file_path) as f:
+                return f.read().split()[0].lower()
+        except (OSError, IndexError):
+            return None
+    
+    def verify_video_hash(self):
+        """Save the downloaded file's SHA-256 and check it against EXPECTED_SHA256"""
+        digest = self.video_hash
+        if digest is None:
+            digest = self.hash_file()
+            # Hashing read the whole file back into the page cache
+            self.drop_video_cache()
+        self.print_status(f"SHA-256: {digest}", "🔒")
+        
+        if self.expected_sha256 and digest != self.expected_sha256:
+            self.print_status(f"Checksum mismatch, expected {self.expected_sha256}", "❌")
+            return False
+        
+        with open(self.hash_file_path, 'w') as f:
+            f.write(f"{digest}  {os.path.basename(self.video_file)}\n")
+        return True
+    
     def get_video_duration(self):
         """Get video duration using ffprobe"""
+        if self.video_duration is not None:
+            return self.video_duration
+        
         try:
             cmd = [
                 'ffprobe',
@@ -231,65 +627,258 @@ class YouTubeStreamer:
             seconds = int(duration % 60)
             
             self.print_status(f"Video duration: {hours:02d}:{minutes:02d}:{seconds:02d}", "⏱️")
+            self.video_duration = duration
             return duration
             
         except Exception as e:
             self.print_status(f"Could not determine duration: {e}", "⚠️")
             return None
     
-    def start_streaming(self):
-        """Start FFmpeg streaming in loop"""
-        self.print_status("Starting FFmpeg stream...", "🚀")
+    def probe_streams(self):
+        """Get codec and resolution of the video file streams using ffprobe"""
+        try:
+            cmd = [
+                'ffprobe',
+                '-v', 'error',
+                '-show_entries', 'stream=codec_type,codec_name,width,height,pix_fmt,bit_rate',
+                '-of', 'json',
+                self.video_file
+            ]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                return []
+            
+            return json.loads(result.stdout).get('streams', [])
+            
+        except Exception as e:
+            self.print_status(f"Could not probe streams: {e}", "⚠️")
+            return []
+    
+    def can_stream_copy(self, width, height, bufsize):
+        """Check if the source can be sent to YouTube without re-encoding"""
+        streams = self.probe_streams()
+        video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+        audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+        
+        if not video or not audio:
+            return False
+        
+        if video.get('codec_name') != 'h264' or audio.get('codec_name') != 'aac':
+            return False
+        
+        if (video.get('width'), video.get('height')) != (width, height):
+            return False
+        
+        if video.get('pix_fmt') != 'yuv420p':
+            return False
+        
+        # Allow up to the encoder buffer size (2x target bitrate)
+        max_bitrate = int(bufsize.replace('k', '')) * 1000
+        if int(video.get('bit_rate') or 0) > max_bitrate:
+            return False
+        
+        # Copied GOPs reach YouTube as-is, they must be as short as the encode path's -g 60
+        interval = self.probe_keyframe_interval()
+        if interval is None or interval > self.MAX_KEYFRAME_INTERVAL:
+            self.print_status(f"Keyframe interval {interval or 'unknown'}s too long for stream copy", "⚠️")
+            return False
+        
+        return True
+    
+    def probe_keyframe_interval(self):
+        """Get the longest keyframe spacing in the first seconds of the video using ffprobe"""
+        try:
+            cmd = [
+                'ffprobe',
+                '-v', 'error',
+                '-select_streams', 'v:0',
+                '-skip_frame', 'nokey',
+                '-read_intervals', f'%+{self.KEYFRAME_PROBE_SECONDS}',
+                '-show_entries', 'frame=pts_time',
+                '-of', 'csv=p=0',
+                self.video_file
+            ]
+            
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            if result.returncode != 0:
+                return None
+            
+            times = [float(t) for t in result.stdout.split() if t != 'N/A']
+            if len(times) < 2:
+                return None  # At most one keyframe in the whole probe window
+            
+            return max(b - a for a, b in zip(times, times[1:]))
+            
+        except Exception as e:
+            self.print_status(f"Could not probe keyframes: {e}", "⚠️")
+            return None
+    
+    def detect_encoder(self):
+        """Pick the first working hardware H.264 encoder, else libx264"""
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                    capture_output=True, text=True, timeout=30)
+            available = result.stdout
+        except Exception as e:
+            self.print_status(f"Could not list encoders: {e}", "⚠️")
+            return 'libx264'
+        
+        for name, encoder in self.VIDEO_ENCODERS.items():
+            if name == 'libx264' or name not in available:
+                continue
+            
+            # Encoders are listed even without the hardware, so test one frame
+            cmd = [
+                'ffmpeg', '-hide_banner', '-v', 'error',
+                *encoder['input'],
+                '-f', 'lavfi', '-i', 'color=black:s=256x144',
+                '-vf', 'null' + encoder['filter'],
+                '-frames:v', '1',
+                *encoder['codec'],
+                '-f', 'null', '-'
+            ]
+            try:
+                if subprocess.run(cmd, capture_output=True, timeout=30).returncode == 0:
+                    return name
+            except Exception:
+                pass
+        
+        return 'libx264'
+    
+    def launch_ffmpeg(self, ffmpeg_cmd):
+        """Start FFmpeg with background threads draining its log and progress"""
+        process = subprocess.Popen(
+            ffmpeg_cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self.last_progress = time.monotonic()
+        self.stream_position = 0
+        threading.Thread(target=self.drain_ffmpeg_log, args=(process,), daemon=True).start()
+        threading.Thread(target=self.drain_ffmpeg_progress, args=(process,), daemon=True).start()
+        return process
+    
+    def drain_ffmpeg_log(self, process):
+        """Read FFmpeg stderr so the pipe never fills, echoing warnings"""
+        last_seen = {}
+        suppressed = {}
+        for line in io.TextIOWrapper(process.stderr, encoding='utf-8', errors='replace'):
+            line = line.strip()
+            if not line:
+                continue
+            
+            # Warnings can repeat every frame, echo each kind once per log_interval
+            key = _FFMPEG_NUMBER_RE.sub('#', line)
+            now = time.monotonic()
+            if now - last_seen.get(key, -self.log_interval) < self.log_interval:
+                suppressed[key] = suppressed.get(key, 0) + 1
+                continue
+            
+            last_seen[key] = now
+            repeats = suppressed.pop(key, 0)
+            if repeats:
+                line += f" (repeated {repeats} more times)"
+            self.print_status(line, "⚠️")
+    
+    def drain_ffmpeg_progress(self, process):
+        """Read FFmpeg -progress output, tracking when frames last advanced"""
+        stats = {}
+        last_frame = None
+        last_report = 0
+        for line in io.TextIOWrapper(process.stdout, encoding='utf-8', errors='replace'):
+            key, _, value = line.strip().partition('=')
+            stats[key] = value
+            if key != 'progress':
+                continue
+            
+            # A block ends with progress=continue, only count it if frames moved
+            frame = stats.get('frame')
+            if frame != last_frame:
+                last_frame = frame
+                self.last_progress = time.monotonic()
+            
+            try:
+                self.stream_position = int(stats.get('out_time_us', '')) / 1000000
+            except ValueError:
+                pass
+            
+            if self.last_progress - last_report >= self.log_interval:
+                last_report = self.last_progress
+                self.print_status(
+                    f"frame={stats.get('frame')} fps={stats.get('fps')} "
+                    f"bitrate={stats.get('bitrate')} time={stats.get('out_time')} "
+                    f"speed={stats.get('speed')}", "📈")
+    
+    def wait_ffmpeg(self, process):
+        """Wait for FFmpeg to exit, killing it if its output stalls"""
+        # FFmpeg re-reads the looping file forever, drop its cache once per loop
+        next_drop = None
+        if self.loop and self.video_duration:
+            next_drop = time.monotonic() + self.video_duration
+        
+        while True:
+            try:
+                return process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                if next_drop is not None and time.monotonic() >= next_drop:
+                    self.drop_video_cache()
+                    next_drop += self.video_duration
+                
+                if time.monotonic() - self.last_progress > self.stall_timeout:
+                    self.print_status(f"No progress for {self.stall_timeout}s, restarting FFmpeg...", "🧊")
+                    process.kill()
+                    return process.wait()
+    
+    def build_ffmpeg_cmd(self, input_args=None, allow_copy=True):
+        """Build the FFmpeg command streaming the given input (default: video file) to YouTube"""
+        if input_args is None:
+            if self.loop:
+                input_args = ['-stream_loop', '-1', '-re', '-i', self.video_file]  # Loop forever
+            else:
+                input_args = ['-re', '-i', self.video_file]
+        
         self.print_status(f"Quality: {self.quality}", "🎬")
         self.print_status(f"Aspect Ratio: {self.aspect_ratio}", "📐")
         
-        # Parse quality
-        if 'p' in self.quality:
-            height = int(self.quality.replace('p', ''))
-            
-            # Calculate width based on aspect ratio
-            if self.aspect_ratio == '16:9':
-                width = int(height * 16 / 9)
-            elif self.aspect_ratio == '9:16':
-                width = int(height * 9 / 16)
-            elif self.aspect_ratio == '4:3':
-                width = int(height * 4 / 3)
-            elif self.aspect_ratio == '1:1':
-                width = height
-            else:
-                width = int(height * 16 / 9)
-            
-            width = width if width % 2 == 0 else width + 1
-        else:
-            width, height = 1280, 720
-        
-        # Video bitrate based on quality
-        bitrate_map = {
-            360: '800k',
-            480: '1200k',
-            720: '2500k',
-            1080: '4500k',
-            1440: '9000k',
-            2160: '20000k'
-        }
-        video_bitrate = bitrate_map.get(height, '2500k')
+        # Output resolution and bitrate for quality and aspect ratio
+        key = (self.quality, self.aspect_ratio)
+        if key not in self.RES_TABLE:
+            fallback = (self.quality, '16:9') if (self.quality, '16:9') in self.RES_TABLE else ('720p', '16:9')
+            self.print_status(f"Unsupported quality/aspect ratio {self.quality} {self.aspect_ratio}, "
+                              f"using {fallback[0]} {fallback[1]}", "⚠️")
+            key = fallback
+        width, height, video_bitrate, bufsize = self.RES_TABLE[key]
         
         self.print_status(f"Output resolution: {width}x{height}", "📺")
         self.print_status(f"Video bitrate: {video_bitrate}", "💾")
         
-        # FFmpeg command for 24/7 loop
-        ffmpeg_cmd = [
+        if allow_copy and self.can_stream_copy(width, height, bufsize):
+            self.print_status("Source already matches output, using stream copy", "⚡")
+            return [
+                'ffmpeg',
+                *self.FFMPEG_LOG_ARGS,
+                *input_args,
+                '-c:v', 'copy',
+                '-c:a', 'copy',
+                '-bsf:a', 'aac_adtstoasc',
+                '-f', 'flv',
+                self.rtmp_url
+            ]
+        
+        encoder = self.VIDEO_ENCODERS[self.video_encoder]
+        self.print_status(f"Video encoder: {self.video_encoder}", "🎛️")
+        
+        return [
             'ffmpeg',
-            '-stream_loop', '-1',  # Loop forever
-            '-re',
-            '-i', self.video_file,
-            '-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2',
-            '-c:v', 'libx264',
-            '-preset', 'veryfast',
+            *self.FFMPEG_LOG_ARGS,
+            *encoder['input'],
+            *input_args,
+            '-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2' + encoder['filter'],
+            *encoder['codec'],
             '-b:v', video_bitrate,
             '-maxrate', video_bitrate,
-            '-bufsize', str(int(video_bitrate.replace('k', '')) * 2) + 'k',
-            '-pix_fmt', 'yuv420p',
+            '-bufsize', bufsize,
             '-g', '60',
             '-c:a', 'aac',
             '-b:a', '128k',
@@ -297,6 +886,32 @@ class YouTubeStreamer:
             '-f', 'flv',
             self.rtmp_url
         ]
+    
+    def stream_from_url(self):
+        """Let FFmpeg read a direct URL itself, without saving it to disk"""
+        self.print_status("Streaming directly from URL (no download)...", "📡")
+        
+        # FFmpeg resumes dropped HTTP connections with ranged requests
+        self.ffmpeg_cmd = self.build_ffmpeg_cmd([
+            '-reconnect', '1',
+            '-reconnect_streamed', '1',
+            '-reconnect_delay_max', '5',
+            '-re',
+            '-i', self.video_url
+        ], allow_copy=False)
+        
+        return self.start_streaming()
+    
+    def backoff_delay(self, attempt):
+        """Seconds to wait before restart number attempt, with jitter"""
+        return min(self.max_retry_delay, self.retry_delay * 2 ** min(attempt, 6)) + random.uniform(0, 2)
+    
+    def start_streaming(self):
+        """Start FFmpeg streaming in loop"""
+        self.print_status("Starting FFmpeg stream...", "🚀")
+        
+        if self.ffmpeg_cmd is None:
+            self.ffmpeg_cmd = self.build_ffmpeg_cmd()
         
         self.print_status("🔴 LIVE - Stream running 24/7...", "▶️")
         self.print_status("Stream will continue until workflow timeout", "⏰")
@@ -304,31 +919,175 @@ class YouTubeStreamer:
         # Start streaming with auto-restart
         attempt = 0
         while attempt < 999:  # Virtually unlimited retries
+            process = None
+            started = time.monotonic()
             try:
                 self.print_status(f"Stream session {attempt + 1}", "🔄")
                 
-                process = subprocess.run(
-                    ffmpeg_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
+                process = self.launch_ffmpeg(self.ffmpeg_cmd)
+                self.wait_ffmpeg(process)
+                
+                # Without looping, a clean exit means the video has finished
+                if not self.loop and process.returncode == 0:
+                    self.print_status("Video finished", "🏁")
+                    return True
                 
                 # If stream ends, retry
                 self.print_status(f"Stream ended (code {process.returncode}), restarting...", "🔄")
                     
             except KeyboardInterrupt:
+                if process:
+                    process.terminate()
                 self.print_status("Stream stopped by user", "🛑")
                 return True
                 
             except Exception as e:
                 self.print_status(f"Stream error: {e}", "❌")
             
+            # Exponential backoff with jitter, reset after a long healthy session
+            if time.monotonic() - started > self.healthy_session:
+                attempt = 0
+            delay = self.backoff_delay(attempt)
             attempt += 1
-            time.sleep(self.retry_delay)
+            
+            self.print_status(f"Reconnecting in {delay:.1f}s...", "⏳")
+            time.sleep(delay)
         
         return True
     
+    def prepare_video(self):
+        """Download and verify the video file"""
+        # Reuse a previous download if it matches the expected checksum
+        cached = (self.expected_sha256 and os.path.exists(self.video_file)
+                  and self.read_cached_hash() == self.expected_sha256)
+        
+        if cached:
+            self.print_status("Video already downloaded (checksum matches), skipping download", "♻️")
+        else:
+            # The old checksum no longer describes the file once it is overwritten
+            try:
+                os.remove(self.hash_file_path)
+            except FileNotFoundError:
+                pass
+            
+            download = threading.Thread(target=self.download_worker, daemon=True)
+            download.start()
+            
+            if self.loop:
+                self.stream_while_downloading(download)
+            download.join()
+            
+            if not self.download_ok:
+                self.print_status("Failed to download video", "❌")
+                return False
+        
+        # Verify video file
+        if not os.path.exists(self.video_file):
+            self.print_status("Video file not found after download", "❌")
+            return False
+        
+        file_size = os.path.getsize(self.video_file)
+        self.print_status(f"Video file size: {file_size / (1024*1024):.2f} MB", "📁")
+        
+        if file_size < 10000:
+            self.print_status("Video file too small - download failed", "❌")
+            return False
+        
+        if not cached and not self.verify_video_hash():
+            return False
+        
+        return True
+    
+    def download_worker(self):
+        """Thread target running download_video"""
+        self.download_ok = self.download_video()
+    
+    def prepare_stream(self):
+        """Probe the video file, pick the encoder and build the FFmpeg command"""
+        self.get_video_duration()
+        self.video_encoder = self.detect_encoder()
+        self.ffmpeg_cmd = self.build_ffmpeg_cmd()
+    
+    def stream_while_downloading(self, download):
+        """Stream the start of the file without looping until the download finishes"""
+        attempt = 0
+        retry_at = 0
+        margin = self.EARLY_START_BYTES // 2
+        while download.is_alive():
+            if self.early_process is None:
+                # Wait until the start of the file is on disk and FFmpeg can parse it
+                if (time.monotonic() >= retry_at and self.downloaded_prefix >= self.EARLY_START_BYTES
+                        and self.get_video_duration()):
+                    self.start_early_stream()
+            
+            elif self.ffmpeg_cmd is None:
+                # The download restarted with another method, the probed file is gone
+                self.stop_early_stream("Download restarted, stopping early stream...")
+            
+            elif self.early_paused:
+                if self.downloaded_prefix - self.early_read_position() >= 2 * margin:
+                    self.print_status("Download is ahead again, resuming early stream...", "▶️")
+                    self.early_process.send_signal(signal.SIGCONT)
+                    self.early_paused = False
+                    self.last_progress = time.monotonic()
+            
+            elif (self.early_process.poll() is not None
+                    or time.monotonic() - self.last_progress > self.stall_timeout):
+                self.stop_early_stream("Early stream stopped, restarting...")
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                retry_at = time.monotonic() + delay
+                self.print_status(f"Reconnecting in {delay:.1f}s...", "⏳")
+            
+            elif hasattr(signal, 'SIGSTOP') and self.downloaded_prefix - self.early_read_position() < margin:
+                # The rest of the preallocated file is zeros, don't let FFmpeg read into it
+                self.print_status("Early stream caught up with the download, pausing...", "⏸️")
+                self.early_process.send_signal(signal.SIGSTOP)
+                self.early_paused = True
+            
+            download.join(timeout=2)
+    
+    def early_read_position(self):
+        """Estimate how many bytes of the file the early stream has read"""
+        try:
+            size = os.path.getsize(self.video_file)
+        except OSError:
+            return 0
+        if not self.video_duration:
+            return 0
+        return int(size * min(1.0, self.stream_position / self.video_duration))
+    
+    def start_early_stream(self):
+        """Start a non-looping stream of the partially downloaded file"""
+        self.print_status("Start of video is ready, streaming while download finishes...", "⏩")
+        if self.ffmpeg_cmd is None:
+            self.prepare_stream()
+        
+        # Same command, minus -stream_loop: the end of the file isn't there yet
+        early_cmd = list(self.ffmpeg_cmd)
+        loop_at = early_cmd.index('-stream_loop')
+        del early_cmd[loop_at:loop_at + 2]
+        
+        self.early_process = self.launch_ffmpeg(early_cmd)
+        self.early_paused = False
+    
+    def stop_early_stream(self, reason="Download finished, restarting stream with looping..."):
+        """Stop the stream started before the download finished, if any"""
+        if self.early_process is None:
+            return
+        
+        self.print_status(reason, "🔁")
+        self.early_process.terminate()
+        if self.early_paused:
+            self.early_process.send_signal(signal.SIGCONT)  # Stopped processes don't act on SIGTERM
+            self.early_paused = False
+        try:
+            self.early_process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.early_process.kill()
+            self.early_process.wait()
+        self.early_process = None
+    
     def run(self):
         """Main execution"""
         self.print_status("=== YouTube 24/7 Live Streamer ===", "🎥")
@@ -345,25 +1104,29 @@ class YouTubeStreamer:
         self.print_status(f"Stream Key: {self.stream_key[:8]}...{self.stream_key[-4:]}", "🔑")
         self.print_status(f"Video URL: {self.video_url[:60]}...", "🔗")
         
-        # Download video
-        if not self.download_video():
-            self.print_status("Failed to download video", "❌")
-            return False
-        
-        # Verify video file
-        if not os.path.exists(self.video_file):
-            self.print_status("Video file not found after download", "❌")
-            return False
-        
-        file_size = os.path.getsize(self.video_file)
-        self.print_status(f"Video file size: {file_size / (1024*1024):.2f} MB", "📁")
+        # Without looping, direct URLs go straight to FFmpeg
+        if not self.loop and not self.is_google_drive_url(self.video_url):
+            self.video_encoder = self.detect_encoder()
+            success = self.stream_from_url()
+            self.print_status("=== Stream Session Complete ===", "✅")
+            return success
         
-        if file_size < 10000:
-            self.print_status("Video file too small - download failed", "❌")
+        # Download video, streaming its start while the rest arrives
+        ready = False
+        try:
+            ready = self.prepare_video()
+        finally:
+            # Never leave the early FFmpeg pushing a partial file after we exit
+            if ready:
+                self.stop_early_stream()
+            else:
+                self.stop_early_stream("Download failed, stopping early stream...")
+        if not ready:
             return False
         
-        # Get duration
-        self.get_video_duration()
+        # Probe video and build FFmpeg command once, reused by every reconnect
+        if self.ffmpeg_cmd is None:
+            self.prepare_stream()
         
         # Start streaming
         self.start_streaming()